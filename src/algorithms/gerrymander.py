@@ -1,4 +1,4 @@
-from math import ceil
+from math import ceil, isclose
 import random
 from .batch_gerrymander import batch_gerrymander
 
@@ -66,8 +66,26 @@ def random_disctricts(state: list[list[int]]) -> list[list[tuple[int,int]]]:
     return districts
 
 
+def district_distance_penalty(district, n):
+    """This function returns the undivided distance_score contribution of a single district.
+    If the bounding box of the district is small enough, every pair of cities is close enough and the contribution is zero.
+    """
+    tl_r, tl_c = n, n
+    br_r, br_c = -1, -1
+    for city in district:
+        tl_r, tl_c = min(tl_r, city[0]), min(tl_c, city[1])
+        br_r, br_c = max(br_r, city[0]), max(br_c, city[1])
+    if br_r - tl_r + br_c - tl_c <= ceil(n/2):
+        return 0
+
+    return sum([max(0, distance_manhattan(city, district[j]) - ceil(n/2)) ** 2
+                for i, city in enumerate(district) for j in range(i+1, len(district))])
+
+
 def preprocess_solution(state: list[list[int]], initial_districts: list[list[tuple[int,int]]]):
-    """This function preprocesses initial districts and returns what would be used for improving the districts."""
+    """This function preprocesses initial districts and returns what would be used for improving the districts.
+    Besides the lookup tables, it returns the running totals from which the score is derived by running_score().
+    """
     
     n = len(state)
 
@@ -79,7 +97,12 @@ def preprocess_solution(state: list[list[int]], initial_districts: list[list[tup
 
     num_lost_districts = sum([district_votes[idx] <= 500 * len(district) for idx, district in enumerate(initial_districts)])
 
-    return district_city_dict, city_district_dict, district_votes, num_lost_districts
+    total_size_penalty = sum([(len(district) - n) ** 2 for district in initial_districts])
+
+    # Kept undivided so that it stays an integer, it is divided by n only in running_score()
+    total_distance_penalty = sum([district_distance_penalty(district, n) for district in initial_districts])
+
+    return district_city_dict, city_district_dict, district_votes, num_lost_districts, total_size_penalty, total_distance_penalty
 
 
 def post_process(state, district_city_dict):
@@ -92,12 +115,26 @@ def post_process(state, district_city_dict):
     return final_districts
 
 
+def running_score(state):
+    """This function returns the score of the current solution from the running totals, without walking the cities."""
+    n = len(state)
+    return 5 * num_lost_districts**2 + total_size_penalty + total_distance_penalty / n
+
+
 def city_redistricting_cost(city, target_idx, state):
     """This function calculates the net cost of moving city to the district indexed by target_idx."""
+    vote_cost, size_cost, distance_diff = redistricting_cost_components(city, target_idx, state)
+    return vote_cost + size_cost + distance_diff / len(state)
+
+
+def redistricting_cost_components(city, target_idx, state):
+    """This function calculates the net cost of moving city to the district indexed by target_idx, split by score component.
+    The distance component is returned undivided, like total_distance_penalty.
+    """
 
     current_idx = city_district_dict[city]
     if target_idx == current_idx:
-        return 0
+        return 0, 0, 0
 
     n = len(state)
     i,j = city
@@ -121,17 +158,19 @@ def city_redistricting_cost(city, target_idx, state):
     size_cost = 2 * (target_size - current_size + 1) # math jujutsu alert
 
     # distance net cost
-    city_current_distance_contribution = 1 / n * sum([max(0, distance_manhattan(city, other_city) - ceil(n/2)) ** 2
-                                                      for other_city in district_city_dict[current_idx]])
-    city_target_distance_contribution = 1 / n * sum([max(0, distance_manhattan(city, other_city) - ceil(n/2)) ** 2
-                                                     for other_city in district_city_dict[target_idx]])
-    distance_cost = city_target_distance_contribution - city_current_distance_contribution
+    city_current_distance_contribution = sum([max(0, distance_manhattan(city, other_city) - ceil(n/2)) ** 2
+                                              for other_city in district_city_dict[current_idx]])
+    city_target_distance_contribution = sum([max(0, distance_manhattan(city, other_city) - ceil(n/2)) ** 2
+                                             for other_city in district_city_dict[target_idx]])
+    distance_diff = city_target_distance_contribution - city_current_distance_contribution
 
-    return size_cost + vote_cost + distance_cost
+    return vote_cost, size_cost, distance_diff
 
 
-def move_city(city, target_idx, state):
-    """This function moves city to the district indexed by target_idx and updates all relevant variables accordingly."""
+def move_city(city, target_idx, state, distance_diff):
+    """This function moves city to the district indexed by target_idx and updates all relevant variables accordingly.
+    distance_diff is the undivided distance net cost of the move, as returned by redistricting_cost_components().
+    """
     current_idx = city_district_dict[city]
 
     if current_idx == target_idx: # Moot point
@@ -162,12 +201,17 @@ def move_city(city, target_idx, state):
     district_votes[current_idx] -= city_vote
     district_votes[target_idx] += city_vote
 
+    # Update the size and distance running totals
+    global total_size_penalty, total_distance_penalty
+    total_size_penalty += 2 * (target_size - current_size + 1)
+    total_distance_penalty += distance_diff
+
 
 def improve_attempt(city, target_idx, state):
     """This function moves city to the district indexed by target_idx if the net cost of the move is negative."""
-    cost = city_redistricting_cost(city, target_idx, state)    
-    if cost < 0:
-        move_city(city, target_idx, state)
+    vote_cost, size_cost, distance_diff = redistricting_cost_components(city, target_idx, state)
+    if vote_cost + size_cost + distance_diff / len(state) < 0:
+        move_city(city, target_idx, state, distance_diff)
 
 
 def random_neighbor(city, state):
@@ -194,44 +238,55 @@ def improve(state, districts, max_iter):
         improve_attempt(city, target_idx, state)
 
 
-def iterate_from_random(state, max_attempts, max_iter):
+def check_running_score(state, districts, current_score):
+    """This function cross-checks the running score against score_solution() and raises an AssertionError if they differ."""
+    reference_score = score_solution(state, districts)
+    if not isclose(current_score, reference_score):
+        raise AssertionError(f"Running score {current_score} differs from the reference score {reference_score}.")
+
+
+def iterate_from_random(state, max_attempts, max_iter, debug=False):
     """This function generates max_attempt random initialization and attempts max_iter times to improve each of them.
-    At the end it returns the best solution it finds.
+    At the end it returns the best solution it finds along with its score.
+    If debug is True, the running score of each attempt is cross-checked against score_solution().
     """
     best_score = float('inf')
     initial_districts = random_disctricts(state)
     districts = initial_districts.copy()
     for _ in range(max_attempts):
-        global district_city_dict, city_district_dict, district_votes, num_lost_districts
-        district_city_dict, city_district_dict, district_votes, num_lost_districts = preprocess_solution(state, initial_districts)
+        global district_city_dict, city_district_dict, district_votes, num_lost_districts, total_size_penalty, total_distance_penalty
+        district_city_dict, city_district_dict, district_votes, num_lost_districts, total_size_penalty, total_distance_penalty = preprocess_solution(state, initial_districts)
         improve(state, initial_districts, max_iter)
-        improved_districts = post_process(state, district_city_dict)
-        current_score = score_solution(state, improved_districts)
+        current_score = running_score(state)
+        if debug:
+            check_running_score(state, post_process(state, district_city_dict), current_score)
         if current_score < best_score:
-            districts = improved_districts.copy()
+            districts = post_process(state, district_city_dict)
             best_score = current_score
         initial_districts = random_disctricts(state)
-    return districts
+    return districts, best_score
 
 
-def iterate_from_batch_gerrymander(state, buffer_min_lengths=range(1,6), max_iter=1000):
+def iterate_from_batch_gerrymander(state, buffer_min_lengths=range(1,6), max_iter=1000, debug=False):
     """This function generates several initializations using the gerrymader() equipped with various buffer lengths.
-    It then attempts max_iter times to improve each of them, and finally returns the best solution it finds.
+    It then attempts max_iter times to improve each of them, and finally returns the best solution it finds along with its score.
+    If debug is True, the running score of each attempt is cross-checked against score_solution().
     """
 
     best_score = float('inf')
     for buffer_min_length in buffer_min_lengths:
         initial_districts = batch_gerrymander(state, buffer_min_length)
-        global district_city_dict, city_district_dict, district_votes, num_lost_districts
-        district_city_dict, city_district_dict, district_votes, num_lost_districts = preprocess_solution(state, initial_districts)
+        global district_city_dict, city_district_dict, district_votes, num_lost_districts, total_size_penalty, total_distance_penalty
+        district_city_dict, city_district_dict, district_votes, num_lost_districts, total_size_penalty, total_distance_penalty = preprocess_solution(state, initial_districts)
         improve(state, initial_districts, max_iter)
-        improved_districts = post_process(state, district_city_dict)
-        current_score = score_solution(state, improved_districts)
+        current_score = running_score(state)
+        if debug:
+            check_running_score(state, post_process(state, district_city_dict), current_score)
         if current_score < best_score:
-            districts = improved_districts.copy()
+            districts = post_process(state, district_city_dict)
             best_score = current_score
 
-    return districts
+    return districts, best_score
 
 
 def gerrymander(state):
@@ -241,15 +296,13 @@ def gerrymander(state):
     if n <= 320:
         max_attempts = 100 if n <= 12 else 0
         if max_attempts > 0:
-            from_random_districts = iterate_from_random(state, max_attempts=max_attempts, max_iter=20000)
-            from_random_score = score_solution(state, from_random_districts)
+            from_random_districts, from_random_score = iterate_from_random(state, max_attempts=max_attempts, max_iter=20000)
         else:
             from_random_score = float('inf')
 
         step = 1 if n <= 50 else 2 if n <= 150 else 3
         max_iter = 100000 if n < 16 else 50000 if n < 32 else 25000 if n < 64 else 1000
-        from_batch_gerrymander_districts = iterate_from_batch_gerrymander(state, buffer_min_lengths=range(max(1, n // 16), min(40, n * (n//4 + 1) + 1), step), max_iter=max_iter)
-        from_batch_gerrymander_score = score_solution(state, from_batch_gerrymander_districts)
+        from_batch_gerrymander_districts, from_batch_gerrymander_score = iterate_from_batch_gerrymander(state, buffer_min_lengths=range(max(1, n // 16), min(40, n * (n//4 + 1) + 1), step), max_iter=max_iter)
 
         return from_batch_gerrymander_districts if from_batch_gerrymander_score < from_random_score else from_random_districts
 
@@ -15,8 +15,12 @@ from .measure import (
 )
 from .visualization import (
     display_data_as_table,
+    export_measures_csv,
+    export_measures_json,
     plot_power_test,
     plot_ratio_test,
     plot_constant_test,
+    districts_label_grid,
+    save_map_of_districts,
     drawmap_of_districts
 )
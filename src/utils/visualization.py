@@ -1,27 +1,59 @@
-import matplotlib.pyplot as plt
-from scipy.stats import linregress
+import csv
+import json
+from itertools import chain
+from math import ceil
 from .measure import Measure
 
+# matplotlib, numpy and scipy are imported lazily inside the functions that need them,
+# so that importing src.utils stays cheap for workers that never plot.
+
 def display_data_as_table(measures: list[Measure]):
     """Prints a table with the data in the given list of measures"""
     print("{: <12} {: <12} {: <12}".format("Taille", "Temps moyen", "Score moyen"))
     for measure in measures:
         print("{: <12} {: <12} {: <12}".format(measure.size, measure.mean, measure.mean_score))
 
+MEASURE_FIELDS = ("size", "mean", "mean_score")
+
+def export_measures_csv(measures: list[Measure], path: str):
+    """Writes the given list of measures to a CSV file with one row per measure"""
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(MEASURE_FIELDS)
+        writer.writerows([getattr(measure, field) for field in MEASURE_FIELDS] for measure in measures)
+
+def export_measures_json(measures: list[Measure], path: str):
+    """Writes the given list of measures to a JSON file as a list of objects"""
+    with open(path, "w") as file:
+        json.dump([{field: getattr(measure, field) for field in MEASURE_FIELDS} for measure in measures], file)
+
+def _show_or_save(plt, output_path: str | None):
+    """Shows the current figure, or writes it to output_path and closes it when a path is given"""
+    if output_path is None:
+        plt.show()
+    else:
+        plt.savefig(output_path)
+        plt.close()
+
 ### The different tests are below, the names are in french to avoid confusion
 
 def plot_power_test(
     data: dict[int,int],
     x_label: str,
     y_label: str,
-    title: str = "Test de puissance"
+    title: str = "Test de puissance",
+    output_path: str | None = None
 ):
     """Takes the data and displays it into the corresponding test graph.
     It applies no transformations to the data.
 
     Args:
         data (dict[int,int]): A dictionnary mapping the x variable to the y variable
+        output_path (str | None): If given, the graph is written to this file instead of being shown
     """
+    import matplotlib.pyplot as plt
+    from scipy.stats import linregress
+
     # Log both sets of values
     x = list(data.keys())
     y = list(data.values())
@@ -52,21 +84,25 @@ def plot_power_test(
     # Display the line equation
     plt.text(min(x), max(y), line_eq)
 
-    # Show the plot
-    plt.show()
+    # Show or save the plot
+    _show_or_save(plt, output_path)
 
 def plot_ratio_test(
     data: dict[int,int],
     x_label: str,
     y_label: str,
-    title: str = "Test de rapport"
+    title: str = "Test de rapport",
+    output_path: str | None = None
 ):
     """Takes the data and displays it into the corresponding test graph.
     It applies no transformations to the data.
 
     Args:
         data (dict[int,int]): A dictionnary mapping the x variable to the y variable
+        output_path (str | None): If given, the graph is written to this file instead of being shown
     """
+    import matplotlib.pyplot as plt
+
     x = list(data.keys())
     y = list(data.values())
 
@@ -77,20 +113,25 @@ def plot_ratio_test(
     plt.xlabel(x_label)
     plt.ylabel(y_label)
     plt.title(title)
-    plt.show()
+    _show_or_save(plt, output_path)
 
 def plot_constant_test(
     data: dict[int,int],
     x_label: str,
     y_label: str = "Temps (ms)",
-    title: str = "Test de constantes"
+    title: str = "Test de constantes",
+    output_path: str | None = None
 ):
     """Takes the data and displays it into the corresponding test graph.
     It applies no transformations to the data.
 
     Args:
         data (dict[int,int]): A dictionnary mapping the x variable to the y variable
+        output_path (str | None): If given, the graph is written to this file instead of being shown
     """
+    import matplotlib.pyplot as plt
+    from scipy.stats import linregress
+
     x = list(data.keys())
     y = list(data.values())
 
@@ -119,15 +160,67 @@ def plot_constant_test(
     # Display the line equation
     plt.text(min(x), max(y), line_eq)
 
-    # Show the plot
-    plt.show()
+    # Show or save the plot
+    _show_or_save(plt, output_path)
+
+def districts_label_grid(n: int, districts: list[list[tuple[int,int]]]):
+    """Returns an n x n numpy array where each city holds the 1-based index of its district.
+    Cities that belong to no district hold 0.
+    The labels are scattered with a single vectorized assignment instead of one city at a time.
+    """
+    import numpy as np
+
+    grid = np.zeros((n, n), dtype=np.int32)
+    sizes = [len(district) for district in districts]
+    num_cities = sum(sizes)
+    if num_cities == 0:
+        return grid
+
+    coords = np.fromiter(chain.from_iterable(chain.from_iterable(districts)), dtype=np.intp, count=2 * num_cities)
+    coords = coords.reshape(num_cities, 2)
+    labels = np.repeat(np.arange(1, len(districts) + 1, dtype=np.int32), sizes)
+    grid[coords[:, 0], coords[:, 1]] = labels
+    return grid
+
+def save_map_of_districts(
+    state_map: list[list[int]],
+    districts: list[list[tuple[int,int]]],
+    output_path: str,
+    max_pixels: int = 2048
+):
+    """Writes the map of the districts directly to a PNG file, without going through a figure.
+
+    Args:
+        max_pixels (int): Maximum width and height of the image. Larger maps are downsampled
+            by keeping one city every ceil(n / max_pixels) rows and columns.
+    """
+    from matplotlib.image import imsave
 
-def drawmap_of_districts(state_map: list[list[int]], districts: list[list[tuple[int,int]]]):
     n = len(state_map)
-    colors = [[0 for _ in range(n)] for _ in range(n)]
-    for i, district in enumerate(districts):
-        for city in district:
-            colors[city[0]][city[1]] = i+1
+    grid = districts_label_grid(n, districts)
+
+    # Fix the color range on the full grid so that downsampling does not shift the colors
+    vmin, vmax = int(grid.min()), int(grid.max())
+    stride = ceil(n / max_pixels)
+    if stride > 1:
+        grid = grid[::stride, ::stride]
+
+    imsave(output_path, grid, cmap='nipy_spectral', vmin=vmin, vmax=vmax, format='png')
+
+def drawmap_of_districts(
+    state_map: list[list[int]],
+    districts: list[list[tuple[int,int]]],
+    output_path: str | None = None,
+    max_pixels: int = 2048
+):
+    """Displays the map of the districts, or writes it to output_path as a PNG file when a path is given.
+    See save_map_of_districts for the headless behaviour."""
+    if output_path is not None:
+        save_map_of_districts(state_map, districts, output_path, max_pixels)
+        return
+
+    import matplotlib.pyplot as plt
 
+    colors = districts_label_grid(len(state_map), districts)
     plt.imshow(colors, cmap='nipy_spectral')
     plt.show()